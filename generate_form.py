@@ -1,12 +1,24 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import functools
 import json
+import os
+import sys
+import tempfile
+import threading
+from collections.abc import Sequence
 from pathlib import Path
 from typing import Any
 
 from quiz_markdown import parse_quiz_markdown
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
 SCOPES = [
     "https://www.googleapis.com/auth/forms.body",
     "https://www.googleapis.com/auth/forms.body.readonly",
@@ -15,7 +27,7 @@ SCOPES = [
 
 QUIZ_TITLE = "ATS Quiz"
 
-multiple_choice = [
+multiple_choice: list[dict[str, Any]] = [
     {
         "title": "1. What is the main purpose of Air Traffic Services (ATS)?",
         "options": [
@@ -124,149 +136,211 @@ short_answers = [
 ]
 
 
-def authorize() -> Any:
-    from google.auth.transport.requests import Request
+def dumps_json(obj: Any, *, pretty: bool = True) -> bytes:
+    """Serialize ``obj`` as UTF-8 JSON, using orjson when available.
+
+    ``pretty`` indents by two spaces; otherwise the output is compact.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else None)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+TOKEN_PATH = Path("token.json")
+
+# (token.json mtime, credentials, service) from the last authorize() call.
+# Building the service parses the Forms discovery document and loading the
+# token parses JSON, so both are reused until token.json changes on disk.
+_service_cache: tuple[int | None, Any, Any] | None = None
+_service_lock = threading.Lock()
+
+
+def _token_mtime(token_path: Path) -> int | None:
+    try:
+        return token_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _load_credentials(token_path: Path) -> Any:
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
-    from googleapiclient.discovery import build
 
     creds = None
-    token_path = Path("token.json")
     if token_path.exists():
         creds = Credentials.from_authorized_user_file(token_path, SCOPES)
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+            _refresh_credentials(creds)
         else:
             flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
             creds = flow.run_local_server(port=0)
-        token_path.write_text(creds.to_json())
-        token_path.chmod(0o600)
-    return build("forms", "v1", credentials=creds)
+        _save_token(token_path, creds)
+    return creds
+
+
+def _refresh_credentials(creds: Any) -> None:
+    from google.auth.transport.requests import Request
+
+    creds.refresh(Request())
+
+
+def _save_token(token_path: Path, creds: Any) -> None:
+    # Write a uniquely named 0600 sibling and rename it over the token, so the
+    # refresh token is never world-readable and concurrent writers (e.g. the
+    # CLI while the web UI refreshes) can't publish each other's partial file.
+    fd, tmp_name = tempfile.mkstemp(dir=token_path.parent, prefix=token_path.name)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(creds.to_json())
+        os.replace(tmp_name, token_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def _build_service(creds: Any) -> Any:
+    import google_auth_httplib2
+    from googleapiclient.discovery import build
+    from googleapiclient.http import HttpRequest, build_http
+
+    # httplib2 connections are not thread-safe, so give every request its own
+    # instead of sharing the one bound to the cached service. build_http()
+    # keeps the client's default socket timeout and redirect handling.
+    def request_builder(http: Any, *args: Any, **kwargs: Any) -> HttpRequest:
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+        return HttpRequest(http, *args, **kwargs)
+
+    return build(
+        "forms",
+        "v1",
+        credentials=creds,
+        requestBuilder=request_builder,
+        static_discovery=True,
+    )
+
+
+def authorize() -> Any:
+    global _service_cache
+    # The Google client imports stay in the helpers below: they take a few
+    # hundred ms, which --dry-run and the web UI's startup shouldn't pay, and
+    # with the service cached they only run on the first call or a refresh.
+    with _service_lock:
+        if _service_cache is not None:
+            mtime, creds, service = _service_cache
+            if mtime == _token_mtime(TOKEN_PATH):
+                if creds.valid:
+                    return service
+                if creds.expired and creds.refresh_token:
+                    _refresh_credentials(creds)
+                    _save_token(TOKEN_PATH, creds)
+                    _service_cache = (_token_mtime(TOKEN_PATH), creds, service)
+                    return service
+
+        creds = _load_credentials(TOKEN_PATH)
+        service = _build_service(creds)
+        _service_cache = (_token_mtime(TOKEN_PATH), creds, service)
+        return service
+
+
+def _true_false_options() -> list[dict]:
+    return [{"value": "True"}, {"value": "False"}]
+
+
+def _text_question() -> dict:
+    return {"required": True, "textQuestion": {"paragraph": False}}
+
+
+def _page_break_request(title: str, idx: int) -> dict:
+    return {
+        "createItem": {
+            "item": {"title": title, "pageBreakItem": {}},
+            "location": {"index": idx},
+        }
+    }
+
+
+def _question_request(title: str, question: dict, idx: int) -> dict:
+    return {
+        "createItem": {
+            "item": {"title": title, "questionItem": {"question": question}},
+            "location": {"index": idx},
+        }
+    }
+
+
+def _choice_question(options: Sequence[dict], answer: str | None) -> dict:
+    question: dict = {
+        "required": True,
+        "choiceQuestion": {
+            "type": "RADIO",
+            "options": options,
+            "shuffle": False,
+        },
+    }
+    if answer:
+        question["grading"] = {
+            "pointValue": 1,
+            "correctAnswers": {"answers": [{"value": answer}]},
+        }
+    return question
 
 
 def build_requests() -> list[dict]:
+    """Return the built-in quiz's requests.
+
+    The list is new on every call, but the request dicts in it are cached and
+    shared between calls, so treat them as read-only.
+    """
+    return list(_static_requests())
+
+
+@functools.lru_cache(maxsize=1)
+def _static_requests() -> tuple[dict, ...]:
+    # Built from the module-level quiz constants, so the result never changes.
     requests: list[dict] = []
     idx = 0
-    requests.append(
-        {
-            "createItem": {
-                "item": {"title": "Part 1 – Multiple choice", "pageBreakItem": {}},
-                "location": {"index": idx},
-            }
-        }
-    )
+    requests.append(_page_break_request("Part 1 – Multiple choice", idx))
     idx += 1
     for mc_q in multiple_choice:
-        requests.append(
-            {
-                "createItem": {
-                    "item": {
-                        "title": mc_q["title"],
-                        "questionItem": {
-                            "question": {
-                                "required": True,
-                                "grading": {
-                                    "pointValue": 1,
-                                    "correctAnswers": {
-                                        "answers": [{"value": mc_q["answer"]}]
-                                    },
-                                },
-                                "choiceQuestion": {
-                                    "type": "RADIO",
-                                    "options": [
-                                        {"value": opt} for opt in mc_q["options"]
-                                    ],
-                                    "shuffle": False,
-                                },
-                            }
-                        },
-                    },
-                    "location": {"index": idx},
-                }
-            }
-        )
+        options = [{"value": opt} for opt in mc_q["options"]]
+        question = _choice_question(options, mc_q["answer"])
+        requests.append(_question_request(mc_q["title"], question, idx))
         idx += 1
 
-    requests.append(
-        {
-            "createItem": {
-                "item": {"title": "Part 2 – True / False", "pageBreakItem": {}},
-                "location": {"index": idx},
-            }
-        }
-    )
+    requests.append(_page_break_request("Part 2 – True / False", idx))
     idx += 1
     for tf_q in true_false:
-        requests.append(
-            {
-                "createItem": {
-                    "item": {
-                        "title": tf_q["title"],
-                        "questionItem": {
-                            "question": {
-                                "required": True,
-                                "grading": {
-                                    "pointValue": 1,
-                                    "correctAnswers": {
-                                        "answers": [{"value": tf_q["answer"]}]
-                                    },
-                                },
-                                "choiceQuestion": {
-                                    "type": "RADIO",
-                                    "options": [{"value": "True"}, {"value": "False"}],
-                                    "shuffle": False,
-                                },
-                            }
-                        },
-                    },
-                    "location": {"index": idx},
-                }
-            }
-        )
+        question = _choice_question(_true_false_options(), tf_q["answer"])
+        requests.append(_question_request(tf_q["title"], question, idx))
         idx += 1
 
-    requests.append(
-        {
-            "createItem": {
-                "item": {"title": "Part 3 – Short Answer", "pageBreakItem": {}},
-                "location": {"index": idx},
-            }
-        }
-    )
+    requests.append(_page_break_request("Part 3 – Short Answer", idx))
     idx += 1
     for title in short_answers:
-        requests.append(
-            {
-                "createItem": {
-                    "item": {
-                        "title": title,
-                        "questionItem": {
-                            "question": {
-                                "required": True,
-                                "textQuestion": {"paragraph": False},
-                            }
-                        },
-                    },
-                    "location": {"index": idx},
-                }
-            }
-        )
+        requests.append(_question_request(title, _text_question(), idx))
         idx += 1
-    return requests
+    return tuple(requests)
+
+
+def _choice_lookup(options: Sequence[str]) -> dict[str, str]:
+    # Reversed so that, as with a linear scan, the first matching option wins.
+    return {opt.strip().lower(): opt for opt in reversed(options)}
 
 
-def _normalize_choice_answer(answer: str, options: list[str]) -> str | None:
+def _normalize_choice_answer(
+    answer: str, options: Sequence[str], lookup: dict[str, str]
+) -> str | None:
     a = answer.strip()
     if len(a) == 1 and "A" <= a.upper() <= "H":
         idx = ord(a.upper()) - ord("A")
         if 0 <= idx < len(options):
             return options[idx]
         return None
-    for opt in options:
-        if opt.strip().lower() == a.lower():
-            return opt
-    return None
+    return lookup.get(a.lower())
 
 
 def _normalize_true_false_answer(answer: str) -> str | None:
@@ -278,75 +352,53 @@ def _normalize_true_false_answer(answer: str) -> str | None:
     return None
 
 
+def _true_false_from_section(q: dict) -> dict:
+    answer = q.get("answer")
+    return _choice_question(
+        _true_false_options(), answer and _normalize_true_false_answer(answer)
+    )
+
+
+def _multiple_choice_from_section(q: dict) -> dict:
+    options = q.get("options") or ()
+    if len(options) < 2:
+        return _text_question()
+    answer = q.get("answer")
+    normalized = None
+    if answer:
+        lookup = _choice_lookup(options)
+        normalized = _normalize_choice_answer(answer, options, lookup)
+    return _choice_question([{"value": opt} for opt in options], normalized)
+
+
+def _short_answer_from_section(q: dict) -> dict:
+    return _text_question()
+
+
+# Question body builder per parsed question type; questions of any other type
+# are skipped.
+_SECTION_QUESTION_BUILDERS = {
+    "true_false": _true_false_from_section,
+    "multiple_choice": _multiple_choice_from_section,
+    "short_answer": _short_answer_from_section,
+}
+
+
 def build_requests_from_sections(sections: list[dict]) -> list[dict]:
     requests: list[dict] = []
     idx = 0
 
     for section in sections:
-        title = section.get("title") or "Section"
-        requests.append(
-            {
-                "createItem": {
-                    "item": {"title": title, "pageBreakItem": {}},
-                    "location": {"index": idx},
-                }
-            }
-        )
+        requests.append(_page_break_request(section.get("title") or "Section", idx))
         idx += 1
 
         for q in section.get("questions", []):
+            builder = _SECTION_QUESTION_BUILDERS.get(q.get("type"))
+            if builder is None:
+                continue
             qtitle = q.get("title") or "Question"
-            qtype = q.get("type")
-            qanswer = q.get("answer")
-
-            if qtype in {"multiple_choice", "true_false"}:
-                options = list(q.get("options") or [])
-                if qtype == "true_false":
-                    options = ["True", "False"]
-                if len(options) < 2:
-                    qtype = "short_answer"
-                else:
-                    question: dict = {
-                        "required": True,
-                        "choiceQuestion": {
-                            "type": "RADIO",
-                            "options": [{"value": opt} for opt in options],
-                            "shuffle": False,
-                        },
-                    }
-
-                    if qanswer:
-                        if qtype == "true_false":
-                            normalized = _normalize_true_false_answer(qanswer)
-                        else:
-                            normalized = _normalize_choice_answer(qanswer, options)
-                        if normalized:
-                            question["grading"] = {
-                                "pointValue": 1,
-                                "correctAnswers": {"answers": [{"value": normalized}]},
-                            }
-
-                    item = {"title": qtitle, "questionItem": {"question": question}}
-                    requests.append(
-                        {"createItem": {"item": item, "location": {"index": idx}}}
-                    )
-                    idx += 1
-                    continue
-
-            if qtype == "short_answer":
-                item = {
-                    "title": qtitle,
-                    "questionItem": {
-                        "question": {
-                            "required": True,
-                            "textQuestion": {"paragraph": False},
-                        }
-                    },
-                }
-                requests.append(
-                    {"createItem": {"item": item, "location": {"index": idx}}}
-                )
-                idx += 1
+            requests.append(_question_request(qtitle, builder(q), idx))
+            idx += 1
 
     return requests
 
@@ -360,6 +412,26 @@ def quiz_settings_request() -> dict:
     }
 
 
+def create_form(service: Any, create_body: dict, requests: list[dict]) -> dict:
+    form = service.forms().create(body=create_body).execute()
+    form_id = form["formId"]
+    responder_uri = form.get("responderUri")
+    # `create` normally returns the responder link already; only ask
+    # `batchUpdate` to echo the form back when it didn't, so there is no
+    # separate `get` round-trip either way.
+    update = (
+        service.forms()
+        .batchUpdate(
+            formId=form_id,
+            body={"requests": requests, "includeFormInResponse": not responder_uri},
+        )
+        .execute()
+    )
+    if not responder_uri:
+        responder_uri = update.get("form", {}).get("responderUri", "")
+    return {"formId": form_id, "responderUri": responder_uri}
+
+
 def main():
     parser = argparse.ArgumentParser(description="Create a Google Forms quiz.")
     parser.add_argument(
@@ -371,7 +443,21 @@ def main():
     parser.add_argument(
         "--input", type=Path, help="Path to a markdown quiz file to convert"
     )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--pretty",
+        action="store_true",
+        default=None,
+        help="Indent JSON output (default when writing to a terminal)",
+    )
+    output.add_argument(
+        "--compact",
+        action="store_false",
+        dest="pretty",
+        help="Write JSON on a single line (default when output is piped)",
+    )
     args = parser.parse_args()
+    pretty = sys.stdout.isatty() if args.pretty is None else args.pretty
 
     create_body = {"info": {"title": args.title}}
     if args.input:
@@ -383,24 +469,18 @@ def main():
     requests = [quiz_settings_request(), *requests]
 
     if args.dry_run:
-        print(
-            json.dumps(
-                {"create": create_body, "batchUpdate": {"requests": requests}}, indent=2
+        sys.stdout.buffer.write(
+            dumps_json(
+                {"create": create_body, "batchUpdate": {"requests": requests}},
+                pretty=pretty,
             )
+            + b"\n"
         )
         return
 
     service = authorize()
-    form = service.forms().create(body=create_body).execute()
-    service.forms().batchUpdate(
-        formId=form["formId"], body={"requests": requests}
-    ).execute()
-    result = service.forms().get(formId=form["formId"]).execute()
-    print(
-        json.dumps(
-            {"formId": form["formId"], "responderUri": result["responderUri"]}, indent=2
-        )
-    )
+    result = create_form(service, create_body, requests)
+    sys.stdout.buffer.write(dumps_json(result, pretty=pretty) + b"\n")
 
 
 if __name__ == "__main__":
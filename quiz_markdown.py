@@ -10,9 +10,13 @@ _ANSWER_RE = re.compile(
     r"^\s*\*{0,2}\s*(?:answer|correct\s*answer|ans)\s*\*{0,2}\s*[:：]\s*(.+?)\s*\*{0,2}\s*$",
     re.IGNORECASE,
 )
+# Characters a line must start with for _ANSWER_RE to have a chance to match.
+_ANSWER_FIRST_CHARS = frozenset("*aAcC")
+_QUESTION_NUMBER_RE = re.compile(r"^\d+\b")
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
-def _strip_inline_md(text: str) -> str:
+def _strip_inline_md_re(text: str) -> str:
     text = text.strip()
     if text.startswith("**") and text.endswith("**") and len(text) >= 4:
         text = text[2:-2].strip()
@@ -20,7 +24,20 @@ def _strip_inline_md(text: str) -> str:
         text = text[1:-1].strip()
     text = text.replace("**", "").replace("*", "")
     text = text.replace("\\.", ".")
-    return re.sub(r"\s+", " ", text).strip()
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _strip_inline_md_fused(text: str) -> str:
+    # Same result as _strip_inline_md_re: the wrapper checks there only remove
+    # `*` and surrounding whitespace, which the blanket `*` removal and the
+    # split/join whitespace collapse already cover.
+    return " ".join(text.replace("*", "").replace("\\.", ".").split())
+
+
+_USE_FUSED_INLINE_STRIP = True
+_strip_inline_md = (
+    _strip_inline_md_fused if _USE_FUSED_INLINE_STRIP else _strip_inline_md_re
+)
 
 
 def _section_kind(title: str) -> str | None:
@@ -106,68 +123,76 @@ def parse_quiz_markdown(markdown: str) -> list[dict]:
         if stripped in {"---", "----", "-----"}:
             continue
 
-        heading_match = _HEADING_RE.match(line)
-        if heading_match:
-            level = len(heading_match.group(1))
-            text = _strip_inline_md(heading_match.group(2))
-
-            if level <= 2:
-                flush_question()
-                if current_section is not None:
-                    flush_section()
-                current_section = {
-                    "title": text,
-                    "kind": _section_kind(text),
-                    "questions": [],
-                }
-                sections.append(current_section)
-                continue
-
-            # level >= 3: likely a question
-            cleaned = _strip_inline_md(text)
-            if re.match(r"^\d+\s*[\.:)]\s*", cleaned) or re.match(r"^\d+\b", cleaned):
+        # Dispatch on the first character so each line only runs the patterns
+        # that could possibly match it.
+        first = stripped[0]
+
+        if first == "#":
+            heading_match = _HEADING_RE.match(line)
+            if heading_match:
+                level = len(heading_match.group(1))
+                text = _strip_inline_md(heading_match.group(2))
+
+                if level <= 2:
+                    flush_question()
+                    if current_section is not None:
+                        flush_section()
+                    current_section = {
+                        "title": text,
+                        "kind": _section_kind(text),
+                        "questions": [],
+                    }
+                    sections.append(current_section)
+                    continue
+
+                # level >= 3: likely a question
+                cleaned = _strip_inline_md(text)
+                if _QUESTION_NUMBER_RE.match(cleaned):
+                    flush_question()
+                    current_question = {"title": cleaned}
+                    continue
+
+            if stripped.startswith("###"):
+                # e.g. ### **1\. Question**
+                title = _strip_inline_md(stripped.lstrip("#").strip())
                 flush_question()
-                current_question = {"title": cleaned}
-                continue
-
-        bold_line_match = _BOLD_LINE_RE.match(line)
-        if bold_line_match:
-            text = _strip_inline_md(bold_line_match.group(1))
-            if text:
-                flush_question()
-                if current_section is not None:
-                    flush_section()
-                current_section = {
-                    "title": text,
-                    "kind": _section_kind(text),
-                    "questions": [],
-                }
-                sections.append(current_section)
-                continue
-
-        if stripped.startswith("###"):
-            # e.g. ### **1\. Question**
-            title = _strip_inline_md(stripped.lstrip("#").strip())
-            flush_question()
-            current_question = {"title": title}
+                current_question = {"title": title}
             continue
 
+        if first == "*":
+            bold_line_match = _BOLD_LINE_RE.match(line)
+            if bold_line_match:
+                text = _strip_inline_md(bold_line_match.group(1))
+                if text:
+                    flush_question()
+                    if current_section is not None:
+                        flush_section()
+                    current_section = {
+                        "title": text,
+                        "kind": _section_kind(text),
+                        "questions": [],
+                    }
+                    sections.append(current_section)
+                    continue
+
         if current_question is None:
             continue
 
-        answer_match = _ANSWER_RE.match(stripped)
-        if answer_match:
-            current_answer = _strip_inline_md(answer_match.group(1))
-            continue
+        if first in _ANSWER_FIRST_CHARS:
+            answer_match = _ANSWER_RE.match(stripped)
+            if answer_match:
+                current_answer = _strip_inline_md(answer_match.group(1))
+                continue
 
-        if stripped.lower().startswith("*answer"):
-            saw_short_answer_prompt = True
+        if first == "*":
+            if stripped.lower().startswith("*answer"):
+                saw_short_answer_prompt = True
             continue
 
-        option_match = _OPTION_RE.match(stripped)
-        if option_match:
-            current_options.append(_strip_inline_md(option_match.group(2)))
-            continue
+        if "A" <= first <= "H" and stripped[1:2] in {".", ")"}:
+            option_match = _OPTION_RE.match(stripped)
+            if option_match:
+                current_options.append(_strip_inline_md(option_match.group(2)))
 
     flush_question()
 
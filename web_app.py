@@ -1,87 +1,133 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import gzip
 import html
-import json
-from email import policy
-from email.parser import BytesParser
+import re
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any
 
-from generate_form import authorize, build_requests_from_sections, quiz_settings_request
+from generate_form import (
+    authorize,
+    build_requests_from_sections,
+    create_form,
+    dumps_json,
+    quiz_settings_request,
+)
 from quiz_markdown import parse_quiz_markdown
 
 
-def _parse_content_type(value: str) -> tuple[str, dict[str, str]]:
-    parts = [p.strip() for p in value.split(";") if p.strip()]
-    ctype = parts[0].lower() if parts else ""
-    params: dict[str, str] = {}
-    for p in parts[1:]:
-        if "=" not in p:
-            continue
-        k, v = p.split("=", 1)
-        k = k.strip().lower()
-        v = v.strip()
-        if len(v) >= 2 and v[0] == v[-1] == '"':
-            v = v[1:-1]
-        params[k] = v
-    return ctype, params
+def _multipart_boundary(content_type: str) -> str | None:
+    # Only the boundary parameter of a multipart/form-data type is ever used,
+    # so pick it out directly instead of parsing every parameter.
+    ctype, _, params = content_type.partition(";")
+    if ctype.strip().lower() != "multipart/form-data":
+        return None
+    start = params.lower().find("boundary=")
+    if start < 0:
+        return None
+    boundary = params[start + len("boundary=") :].split(";", 1)[0]
+    return boundary.strip().strip('"') or None
+
+
+_DISPOSITION_NAME_RE = re.compile(rb'(?:^|;)\s*name="([^"]*)"', re.IGNORECASE)
+_DISPOSITION_FILENAME_RE = re.compile(rb';\s*filename="([^"]*)"', re.IGNORECASE)
 
 
 def _parse_multipart_form_data(
-    content_type: str, body: bytes
-) -> tuple[dict[str, str], dict[str, Any]]:
+    body: bytes, boundary: bytes
+) -> tuple[dict[str, bytes], dict[str, Any]]:
     # Parse multipart/form-data without the deprecated/removed `cgi` module.
-    msg = BytesParser(policy=policy.default).parsebytes(
-        b"Content-Type: "
-        + content_type.encode("utf-8")
-        + b"\r\nMIME-Version: 1.0\r\n\r\n"
-        + body
-    )
-    if not msg.is_multipart():
+    # Browsers send a flat list of parts with a Content-Disposition header and
+    # no transfer encoding, so scanning for the boundary is all that's needed.
+    # Only offsets are tracked; each value is sliced out of `body` exactly once.
+    delimiter = b"--" + boundary
+    pos = body.find(delimiter)
+    if pos < 0:
         raise ValueError("Not a multipart request")
+    pos += len(delimiter)
 
-    fields: dict[str, str] = {}
+    # Values stay raw bytes; callers decode only the fields they actually use.
+    fields: dict[str, bytes] = {}
     files: dict[str, Any] = {}
 
-    for part in msg.iter_parts():
-        name = part.get_param("name", header="content-disposition")
-        if not isinstance(name, str) or not name:
+    # Everything before the first delimiter is the preamble; a delimiter
+    # followed by "--" closes the body (anything after it is the epilogue).
+    while not body.startswith(b"--", pos):
+        next_delimiter = body.find(delimiter, pos)
+        if next_delimiter < 0:
+            raise ValueError("Not a multipart request")
+        head_end = body.find(b"\r\n\r\n", pos, next_delimiter)
+        if head_end < 0:
+            raise ValueError("Malformed multipart part")
+        head = body[pos:head_end]
+        data_start = head_end + 4
+        data_end = next_delimiter
+        if data_end - 2 >= data_start and body.startswith(b"\r\n", data_end - 2):
+            data_end -= 2
+        pos = next_delimiter + len(delimiter)
+
+        disposition = b""
+        content_type = b""
+        for line in head.split(b"\r\n"):
+            key, _, value = line.partition(b":")
+            key = key.strip().lower()
+            if key == b"content-disposition":
+                disposition = value
+            elif key == b"content-type":
+                content_type = value.strip()
+
+        name_match = _DISPOSITION_NAME_RE.search(disposition)
+        if not name_match or not name_match.group(1):
             continue
-        filename = part.get_param("filename", header="content-disposition")
-        payload = part.get_payload(decode=True)
-        data: bytes = payload if isinstance(payload, bytes) else b""
-        if filename:
+        name = name_match.group(1).decode("utf-8", errors="replace")
+        filename_match = _DISPOSITION_FILENAME_RE.search(disposition)
+        if filename_match and filename_match.group(1):
             files[name] = {
-                "filename": filename,
-                "content_type": part.get_content_type(),
-                "data": data,
+                "filename": filename_match.group(1).decode("utf-8", errors="replace"),
+                "content_type": content_type.decode("latin-1") or "text/plain",
+                "data": body[data_start:data_end],
             }
             continue
 
-        charset = part.get_content_charset() or "utf-8"
-        fields[name] = data.decode(charset, errors="replace")
+        fields[name] = body[data_start:data_end]
 
     return fields, files
 
 
-def _page(title: str, body: str) -> str:
-    return f"""<!doctype html>
+# Constant parts of every page, encoded once; _page() only encodes the title
+# and body for each response.
+_PAGE_HEAD = b"""<!doctype html>
 <html lang=\"en\">
   <head>
     <meta charset=\"utf-8\" />
     <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-    <title>{html.escape(title)}</title>
+    <title>"""
+_PAGE_MIDDLE = b"""</title>
   </head>
   <body>
-    {body}
+    """
+_PAGE_TAIL = b"""
   </body>
 </html>
 """
 
 
-def _index_page() -> str:
+def _page(title: str, body: str) -> bytes:
+    return b"".join(
+        (
+            _PAGE_HEAD,
+            html.escape(title).encode("utf-8"),
+            _PAGE_MIDDLE,
+            body.encode("utf-8"),
+            _PAGE_TAIL,
+        )
+    )
+
+
+def _index_page() -> bytes:
     return _page(
         "Markdown → Google Form",
         """
@@ -104,10 +150,111 @@ def _index_page() -> str:
     )
 
 
+_INDEX_PAGE = _index_page()
+_MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
+# Multipart parts _create_page reads; any others are discarded while parsing.
+_FORM_PART_NAMES = frozenset({"title", "dry_run", "file"})
+# Responses at or below this size are sent uncompressed (e.g. the index page).
+_GZIP_MIN_SIZE = 2 * 1024
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in {"gzip", "x-gzip"}:
+            continue
+        params = params.strip().lower()
+        if not params.startswith("q="):
+            return True
+        try:
+            return float(params[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+class _CreateError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _create_page(fields: dict[str, bytes], files: dict[str, Any]) -> bytes:
+    # Shared by both servers: turns a parsed upload into the result page, or
+    # raises _CreateError with the status/message to report instead.
+    title = fields.get("title", b"").decode("utf-8", errors="replace").strip()
+    title = title or "Quiz"
+    dry_run = "dry_run" in fields
+
+    if "file" not in files:
+        raise _CreateError(HTTPStatus.BAD_REQUEST, "Missing file")
+
+    try:
+        markdown = files["file"]["data"].decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        raise _CreateError(
+            HTTPStatus.BAD_REQUEST, "Could not read uploaded file"
+        ) from e
+
+    try:
+        sections = parse_quiz_markdown(markdown)
+        requests = build_requests_from_sections(sections)
+    except Exception as e:
+        raise _CreateError(
+            HTTPStatus.BAD_REQUEST, f"Could not parse markdown: {e}"
+        ) from e
+
+    create_body = {"info": {"title": title}}
+    requests = [quiz_settings_request(), *requests]
+
+    if dry_run:
+        # Sent compact; the button re-indents it in the browser on demand.
+        payload = dumps_json(
+            {"create": create_body, "batchUpdate": {"requests": requests}},
+            pretty=False,
+        ).decode("utf-8")
+        return _page(
+            "Dry run",
+            f"""
+<h1>Dry run</h1>
+<p>No form was created.</p>
+<p><button type=\"button\" onclick=\"prettyPrintPayload()\">Pretty-print</button></p>
+<pre id=\"payload\" style=\"white-space: pre-wrap; overflow-wrap: anywhere\">{html.escape(payload)}</pre>
+<p><a href=\"/\">Back</a></p>
+<script>
+function prettyPrintPayload() {{
+  const pre = document.getElementById("payload");
+  pre.textContent = JSON.stringify(JSON.parse(pre.textContent), null, 2);
+}}
+</script>
+""",
+        )
+
+    try:
+        result = create_form(authorize(), create_body, requests)
+    except Exception as e:
+        raise _CreateError(
+            HTTPStatus.INTERNAL_SERVER_ERROR, f"Google API error: {e}"
+        ) from e
+
+    responder_uri = result["responderUri"]
+    form_id = result["formId"]
+    return _page(
+        "Created",
+        f"""
+<h1>Created</h1>
+<p><b>formId:</b> {html.escape(form_id)}</p>
+<p><b>responderUri:</b> <a href=\"{html.escape(responder_uri)}\">{html.escape(responder_uri)}</a></p>
+<p><a href=\"/\">Create another</a></p>
+""",
+    )
+
+
 class Handler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path in {"/", "/index.html"}:
-            self._send_html(HTTPStatus.OK, _index_page())
+            self._send_html(HTTPStatus.OK, _INDEX_PAGE)
             return
         self.send_error(HTTPStatus.NOT_FOUND)
 
@@ -120,8 +267,8 @@ class Handler(BaseHTTPRequestHandler):
         if not content_type:
             self.send_error(HTTPStatus.BAD_REQUEST, "Missing Content-Type")
             return
-        ctype, params = _parse_content_type(content_type)
-        if ctype != "multipart/form-data" or "boundary" not in params:
+        boundary = _multipart_boundary(content_type)
+        if boundary is None:
             self.send_error(HTTPStatus.BAD_REQUEST, "Expected multipart/form-data")
             return
 
@@ -135,99 +282,131 @@ class Handler(BaseHTTPRequestHandler):
             self.send_error(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
             return
 
-        max_upload_size = 10 * 1024 * 1024  # 10 MB
-        if length > max_upload_size:
+        if length > _MAX_UPLOAD_SIZE:
             self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Upload too large")
             return
 
         body = self.rfile.read(length)
 
         try:
-            fields, files = _parse_multipart_form_data(content_type, body)
-        except Exception as e:
+            fields, files = _parse_multipart_form_data(body, boundary.encode("latin-1"))
+        except ValueError as e:
             self.log_error("Could not parse multipart body: %s", e)
             self.send_error(HTTPStatus.BAD_REQUEST, "Could not parse multipart body")
             return
 
-        title = (fields.get("title") or "Quiz").strip() or "Quiz"
-        dry_run = "dry_run" in fields
-
-        if "file" not in files:
-            self.send_error(HTTPStatus.BAD_REQUEST, "Missing file")
-            return
-
         try:
-            raw = files["file"]["data"]
-            markdown = raw.decode("utf-8")
-        except Exception as e:
-            self.log_error("Could not read uploaded file: %s", e)
-            self.send_error(HTTPStatus.BAD_REQUEST, "Could not read uploaded file")
+            page = _create_page(fields, files)
+        except _CreateError as e:
+            self.send_error(e.status, e.message)
             return
+        self._send_html(HTTPStatus.OK, page)
+
+    def _send_html(self, status: HTTPStatus, body: bytes) -> None:
+        # Same status line and headers as send_response()/send_header(), but
+        # written together with the body in a single call on the socket.
+        extra_headers = ""
+        if len(body) > _GZIP_MIN_SIZE:
+            extra_headers = "Vary: Accept-Encoding\r\n"
+            if _accepts_gzip(self.headers.get("Accept-Encoding", "")):
+                # Level 1 is several times faster than the default and still
+                # shrinks the repetitive dry-run JSON by roughly an order of
+                # magnitude.
+                body = gzip.compress(body, compresslevel=1)
+                extra_headers += "Content-Encoding: gzip\r\n"
+        self.log_request(status, len(body))
+        head = (
+            f"{self.protocol_version} {status.value} {status.phrase}\r\n"
+            f"Server: {self.version_string()}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            "Content-Type: text/html; charset=utf-8\r\n"
+            f"{extra_headers}"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        self.wfile.write(b"".join((head.encode("latin-1"), body)))
 
-        try:
-            sections = parse_quiz_markdown(markdown)
-            requests = build_requests_from_sections(sections)
-        except Exception as e:
-            self.send_error(HTTPStatus.BAD_REQUEST, f"Could not parse markdown: {e}")
-            return
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def _aiohttp_app() -> Any:
+    # Optional event-loop server: uploads are read without a thread each, and
+    # the blocking parse/Google API work runs in the default executor.
+    from aiohttp import BodyPartReader, web
+    from aiohttp.http_exceptions import HttpProcessingError
 
-        create_body = {"info": {"title": title}}
-        requests = [quiz_settings_request(), *requests]
+    async def index(request: web.Request) -> web.Response:
+        return web.Response(body=_INDEX_PAGE, content_type="text/html", charset="utf-8")
 
-        if dry_run:
-            payload = json.dumps(
-                {"create": create_body, "batchUpdate": {"requests": requests}}, indent=2
+    async def create(request: web.Request) -> web.Response:
+        if request.content_type != "multipart/form-data":
+            return web.Response(
+                status=HTTPStatus.BAD_REQUEST, text="Expected multipart/form-data"
             )
-            self._send_html(
-                HTTPStatus.OK,
-                _page(
-                    "Dry run",
-                    f"""
-<h1>Dry run</h1>
-<p>No form was created.</p>
-<pre>{html.escape(payload)}</pre>
-<p><a href=\"/\">Back</a></p>
-""",
-                ),
+
+        if (request.content_length or 0) > _MAX_UPLOAD_SIZE:
+            return web.Response(
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE, text="Upload too large"
             )
-            return
 
+        # client_max_size only bounds each part, so count the whole body here
+        # (chunked uploads carry no Content-Length) and keep only the parts
+        # _create_page reads.
+        fields: dict[str, bytes] = {}
+        files: dict[str, Any] = {}
+        total = 0
         try:
-            service = authorize()
-            form_obj = service.forms().create(body=create_body).execute()
-            service.forms().batchUpdate(
-                formId=form_obj["formId"], body={"requests": requests}
-            ).execute()
-            result = service.forms().get(formId=form_obj["formId"]).execute()
-        except Exception as e:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Google API error: {e}")
-            return
+            async for part in await request.multipart():
+                if not isinstance(part, BodyPartReader):
+                    continue
+                keep = part.name in _FORM_PART_NAMES
+                chunks: list[bytes] = []
+                while chunk := await part.read_chunk():
+                    total += len(chunk)
+                    if total > _MAX_UPLOAD_SIZE:
+                        return web.Response(
+                            status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            text="Upload too large",
+                        )
+                    if keep:
+                        chunks.append(chunk)
+                if not keep or not part.name:
+                    continue
+                data = b"".join(chunks)
+                if part.filename:
+                    files[part.name] = {
+                        "filename": part.filename,
+                        "content_type": part.headers.get("Content-Type", ""),
+                        "data": data,
+                    }
+                else:
+                    fields[part.name] = data
+        except (ValueError, HttpProcessingError):
+            return web.Response(
+                status=HTTPStatus.BAD_REQUEST, text="Could not parse multipart body"
+            )
 
-        responder_uri = result.get("responderUri", "")
-        form_id = form_obj.get("formId", "")
-        self._send_html(
-            HTTPStatus.OK,
-            _page(
-                "Created",
-                f"""
-<h1>Created</h1>
-<p><b>formId:</b> {html.escape(form_id)}</p>
-<p><b>responderUri:</b> <a href=\"{html.escape(responder_uri)}\">{html.escape(responder_uri)}</a></p>
-<p><a href=\"/\">Create another</a></p>
-""",
-            ),
+        try:
+            page = await asyncio.to_thread(_create_page, fields, files)
+        except _CreateError as e:
+            return web.Response(status=e.status, text=e.message)
+        # Same negotiation and compression level as Handler._send_html.
+        headers = {}
+        if len(page) > _GZIP_MIN_SIZE:
+            headers["Vary"] = "Accept-Encoding"
+            if _accepts_gzip(request.headers.get("Accept-Encoding", "")):
+                page = gzip.compress(page, compresslevel=1)
+                headers["Content-Encoding"] = "gzip"
+        return web.Response(
+            body=page, headers=headers, content_type="text/html", charset="utf-8"
         )
 
-    def _send_html(self, status: HTTPStatus, content: str) -> None:
-        body = content.encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
-
-    def log_message(self, format: str, *args) -> None:
-        return
+    app = web.Application(client_max_size=_MAX_UPLOAD_SIZE)
+    app.router.add_get("/", index)
+    app.router.add_get("/index.html", index)
+    app.router.add_post("/create", create)
+    return app
 
 
 def main() -> None:
@@ -236,10 +415,22 @@ def main() -> None:
     )
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--server",
+        choices=["threading", "aiohttp"],
+        default="threading",
+        help="HTTP server to use; 'aiohttp' requires the aiohttp package",
+    )
     args = parser.parse_args()
 
-    server = ThreadingHTTPServer((args.host, args.port), Handler)
     print(f"Open http://{args.host}:{args.port}/")
+    if args.server == "aiohttp":
+        from aiohttp import web
+
+        web.run_app(_aiohttp_app(), host=args.host, port=args.port, print=None)
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
     server.serve_forever()
 
 